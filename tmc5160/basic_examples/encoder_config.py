@@ -12,14 +12,16 @@ If Decimal mode is used in ENC_MODE.ENC_SEL_DECIMAL
 - A decimal part of 5 written to ENC_CONST.DECIMAL
 
 If Decimal is turned off in ENC_MODE, 12.5 needs to be converted to a Q16.16 fixed point number:
-- Integer will be 12 as well
-- Decimal part will be 5 // (1 / 2^16)
+- The whole constant is scaled by 2^16, i.e. (microstep_per_fullstep * fullsteps_per_turn * 2^16) // Encoder_resolution
+- Integer will be 12 as well, the upper 16 bits
+- Decimal part will be 0.5 * 2^16 = 0x8000, the lower 16 bits
 
 The resulting constant represents the number of encoder steps that happen for every stepper microstep.
 """
 import pytrinamic
 from pytrinamic.connections import ConnectionManager
 from pytrinamic.evalboards import TMC5160_eval
+from pytrinamic.helpers import BitField
 
 # System parameters
 microsteps_per_fullstep = 256  # This is the default value in TMC5160, can be configured in CHOPCONF.MRES
@@ -27,9 +29,12 @@ fullsteps_per_turn = 200  # This is usually 200, or 400 on precision steppers.
 encoder_resolution = 10000  # This should be written on the encoder body, P/R number
 
 # Calculating constants for the Q16.16 number mode (default mode)
-encoder_constant = (fullsteps_per_turn * microsteps_per_fullstep) / encoder_resolution
-encoder_constant_integer = int(encoder_constant)
-encoder_constant_fraction = int((encoder_constant - encoder_constant_integer) / (1 / (1 << 16)))
+encoder_constant_q16 = ((fullsteps_per_turn * microsteps_per_fullstep) << 16) // encoder_resolution
+encoder_constant_integer = encoder_constant_q16 >> 16
+encoder_constant_fraction = encoder_constant_q16 & 0xFFFF
+if encoder_constant_integer > 0x7FFF:  # ENC_CONST integer part is a signed 16 bit number
+    raise ValueError(f"Encoder constant integer part {encoder_constant_integer} does not fit in ENC_CONST!")
+encoder_constant = encoder_constant_q16 / (1 << 16)
 
 
 pytrinamic.show_info()
@@ -41,9 +46,10 @@ with ConnectionManager().connect() as my_interface:
     tmc_motor = tmc_eval.motors[0]  # tmc_motor is gor using axis parameters, i.e. high level functions like ramping
 
     # Writing the encoder config registers
-    tmc_eval.write_register_field(tmc_ic.FIELD.ENC_SEL_DECIMAL, False)  # Use the Q16.16 mode
-    tmc_eval.write_register_field(tmc_ic.FIELD.INTEGER, encoder_constant_integer)
-    tmc_eval.write_register_field(tmc_ic.FIELD.FRACTIONAL, encoder_constant_fraction)
+    enc_mode = tmc_eval.read_register(tmc_ic.REG.ENCMODE)  # Read once to keep the other ENCMODE bits
+    _, sel_decimal_mask, sel_decimal_shift = tmc_ic.FIELD.ENC_SEL_DECIMAL
+    tmc_eval.write_register(tmc_ic.REG.ENCMODE, BitField.field_set(enc_mode, sel_decimal_mask, sel_decimal_shift, 0))  # Q16.16
+    tmc_eval.write_register(tmc_ic.REG.ENC_CONST, encoder_constant_q16)  # INTEGER and FRACTIONAL in one 32 bit write
     print("Writing ABN Encoder settings:")
     print(f"Microsteps: {microsteps_per_fullstep}, Motor Steps: {fullsteps_per_turn}, Encoder resolution: {encoder_resolution}")
     print(f"Q16.16: {encoder_constant} -> Int: 0x{encoder_constant_integer:04X}, Frac: 0x{encoder_constant_fraction:04X}")
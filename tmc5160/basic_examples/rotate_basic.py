@@ -13,14 +13,22 @@ with ConnectionManager().connect() as my_interface:
     tmc_ic = tmc_eval.ics[0]  # tmc_ic is for writing registers and using low level functions
     tmc_motor = tmc_eval.motors[0]  # tmc_motor is gor using axis parameters, i.e. high level functions like ramping
 
+    # Ramp register values as (address, value) pairs, in the order they are written
+    reg = tmc_ic.REG
+    ramp_registers = (
+        (reg.A1, 1000),
+        (reg.V1, 50000),
+        (reg.D1, 500),
+        (reg.DMAX, 500),
+        (reg.VSTART, 0),
+        (reg.VSTOP, 10),
+        (reg.AMAX, 1000),
+    )
+
     print("Preparing parameters...")
-    tmc_eval.write_register(tmc_ic.REG.A1, 1000)
-    tmc_eval.write_register(tmc_ic.REG.V1, 50000)
-    tmc_eval.write_register(tmc_ic.REG.D1, 500)
-    tmc_eval.write_register(tmc_ic.REG.DMAX, 500)
-    tmc_eval.write_register(tmc_ic.REG.VSTART, 0)
-    tmc_eval.write_register(tmc_ic.REG.VSTOP, 10)
-    tmc_eval.write_register(tmc_ic.REG.AMAX, 1000)
+    write = tmc_eval.write_register
+    for address, value in ramp_registers:
+        write(address, value)
 
     # Set lower run/standby current
     motorCurrent = 2
@@ -41,9 +49,12 @@ with ConnectionManager().connect() as my_interface:
     print("Moving back to 0...")
     tmc_motor.move_to(0, 7 * 25600)
 
-    # Wait until position 0 is reached
-    while tmc_motor.actual_position != 0:
-        print("Actual position: " + str(tmc_motor.actual_position))
+    # Wait until position 0 is reached, each position read is a round-trip to the eval so only do it once per loop
+    while True:
+        actual_position = tmc_motor.actual_position
+        if actual_position == 0:
+            break
+        print("Actual position: " + str(actual_position))
         time.sleep(0.2)
 
     print("Reached position 0")
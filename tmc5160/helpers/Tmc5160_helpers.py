@@ -1,6 +1,8 @@
-import pytrinamic
-from pytrinamic.connections import ConnectionManager
 from pytrinamic.evalboards import TMC5160_eval
+from pytrinamic.helpers import BitField
+
+# Microsteps per fullstep for each CHOPCONF.MRES value
+_MRES_TABLE = (256, 128, 64, 32, 16, 8, 4, 2, 1)
 
 
 class Tmc5160:
@@ -13,6 +15,9 @@ class Tmc5160:
     - encoder_tick_per_turn: Number of steps per turn the ABN encoder provides, usually P/R on Trinamic encoders
     - microsteps: Microstep setting for motor, number of microsteps per step, default is 256
     - steps_per_turn: Number of steps of stepper motor, usually 200.
+
+    clk_freq, microsteps and steps_per_turn are read-only after init, the microsteps per turn number and the
+    velocity/acceleration scaling factors are derived from them once and shared by the encoder and ramper configuration.
     """
 
     def __init__(self, interface, steps_per_turn=200, clk_freq=12000000, encoder_tick_per_turn=None) -> None:
@@ -27,15 +32,58 @@ class Tmc5160:
         self.tmc_ic = self.tmc_eval.ics[0]
         self.tmc_motor = self.tmc_eval.motors[0]
 
+        # Shadow of the values last written to each register address, used to skip redundant writes
+        self._reg_cache = {}
+
+        # Registers the eval firmware also writes on TMCL motion commands, these are never cached:
+        # - VMAX, RAMPMODE: rotate(), stop() and the MaxVelocity axis parameter used by move_to()
+        # - XTARGET: move_to() and move_by()
+        # - XACTUAL: the ActualPosition axis parameter
+        # - AMAX: the MaxAcceleration axis parameter
+        reg = self.tmc_ic.REG
+        self._firmware_registers = {reg.VMAX, reg.RAMPMODE, reg.XTARGET, reg.XACTUAL, reg.AMAX}
+
         # Read microstep value from registers
-        mres = self.tmc_eval.read_register_field(self.tmc_ic.FIELD.MRES)
-        self.microsteps = None
-        if mres == 0:
-            self.microsteps = 256
-        elif mres == 8:
-            self.microsteps = 1
-        else:
-            self.microsteps = 256 / (1 << mres)
+        chopconf = self._read_register(self.tmc_ic.REG.CHOPCONF)
+        _, mres_mask, mres_shift = self.tmc_ic.FIELD.MRES
+        mres = BitField.field_get(chopconf, mres_mask, mres_shift)
+        if mres >= len(_MRES_TABLE):
+            raise ValueError(f"Invalid CHOPCONF.MRES value {mres}, expected 0 to {len(_MRES_TABLE) - 1}!")
+        self.microsteps = _MRES_TABLE[mres]
+        self._mpt = self.microsteps * self.steps_per_turn  # Microsteps per turn number
+
+        # Scaling factors from microsteps units to internal units, see datasheet page 81
+        self._v_scale = (1 << 23) * 2 / self.ckl_freq
+        self._a_scale = ((1 << 24) * 512 * 256) / (self.ckl_freq * self.ckl_freq)
+
+    def _read_register(self, register):
+        """
+        Reads a whole register, fields living in it can then be decoded without another round-trip to the eval.
+        The register cache entry is dropped, so the next write to this register is always sent.
+        """
+        self._reg_cache.pop(register, None)
+        return self.tmc_eval.read_register(register)
+
+    def _write_register(self, register, value):
+        """
+        Writes a register, unless the same value was already written to it through this class.
+        Writes done directly on tmc_eval are not tracked by the cache, registers also written by the
+        eval firmware are always written.
+        """
+        if register in self._firmware_registers:
+            self.tmc_eval.write_register(register, value)
+        elif self._reg_cache.get(register) != value:
+            self.tmc_eval.write_register(register, value)
+            self._reg_cache[register] = value
+
+    def _check_field_range(self, name, field, value):
+        """
+        Raises a ValueError if value is negative or does not fit in the given register field.
+        """
+        _, mask, shift = field
+        max_value = mask >> shift
+        if value < 0 or value > max_value:
+            raise ValueError(f"{name} value {value} is out of range, must be between 0 and {max_value}!")
 
     def config_encoder(self, encoder_tick_per_turn=None):
         """
@@ -52,21 +100,29 @@ class Tmc5160:
             self.encoder_tick_per_turn = encoder_tick_per_turn
 
         # Calculating constants for the Q16.16 number mode (default mode)
-        encoder_constant = (self.steps_per_turn * self.microsteps) / self.encoder_tick_per_turn
-        encoder_constant_integer = int(encoder_constant)
-        encoder_constant_fraction = int((encoder_constant - encoder_constant_integer) / (1 / (1 << 16)))
+        encoder_constant_q16 = (self._mpt << 16) // self.encoder_tick_per_turn
+        encoder_constant_integer = encoder_constant_q16 >> 16
+        encoder_constant_fraction = encoder_constant_q16 & 0xFFFF
+        if encoder_constant_integer > 0x7FFF:
+            raise ValueError(
+                f"Encoder constant {encoder_constant_q16 / (1 << 16)} does not fit in ENC_CONST, integer part is signed 16 bits!"
+            )
+        encoder_constant = encoder_constant_q16 / (1 << 16)
 
         # Writing the encoder config registers
-        self.tmc_eval.write_register_field(self.tmc_ic.FIELD.ENC_SEL_DECIMAL, False)  # Use the Q16.16 mode
-        self.tmc_eval.write_register_field(self.tmc_ic.FIELD.INTEGER, encoder_constant_integer)
-        self.tmc_eval.write_register_field(self.tmc_ic.FIELD.FRACTIONAL, encoder_constant_fraction)
+        enc_mode = self._read_register(self.tmc_ic.REG.ENCMODE)
+        _, sel_decimal_mask, sel_decimal_shift = self.tmc_ic.FIELD.ENC_SEL_DECIMAL
+        enc_mode_q16 = BitField.field_set(enc_mode, sel_decimal_mask, sel_decimal_shift, 0)  # Use the Q16.16 mode
+        if enc_mode_q16 != enc_mode:  # The read dropped the cache entry, skip the write when Q16.16 is already selected
+            self._write_register(self.tmc_ic.REG.ENCMODE, enc_mode_q16)
+        self._write_register(self.tmc_ic.REG.ENC_CONST, encoder_constant_q16)  # INTEGER and FRACTIONAL in one write
         print("Writing ABN Encoder settings:")
         print(
             f"Microsteps: {self.microsteps}, Motor Steps: {self.steps_per_turn}, Encoder resolution: {self.encoder_tick_per_turn}"
         )
         print(f"Q16.16: {encoder_constant} -> Int: 0x{encoder_constant_integer:04X}, Frac: 0x{encoder_constant_fraction:04X}")
 
-    def config_ramper(self, vstart=0.05, a1=100.0, v1=0.7, amax=70.0, vmax=1.5, dmax=60.0, d1=90.0, vstop=0.05):
+    def config_ramper(self, vstart=0.05, a1=80.0, v1=0.7, amax=70.0, vmax=1.5, dmax=60.0, d1=75.0, vstop=0.05):
         """
         See README for details on ramper, or datasheet.
         All velocities are in rps, all accelerations in rps^2 (rotations per seconds, rotations per second per second)
@@ -79,6 +135,10 @@ class Tmc5160:
         - Ramp steps are in µsteps = v_internal^2 / a_internal / 2^8
 
         To convert from µps to rps, simply divide by the number of microsteps per turn or (microsteps * steps_per_turn)
+
+        Accelerations are 16 bit registers, VMAX is 23 bits, V1 is 20 bits and VSTART/VSTOP are 18 bits.
+        A ValueError is raised if a converted value does not fit, at 12MHz and 256 microsteps the accelerations
+        are limited to about 83 rps^2.
         """
         # Convert all units to internal
         vstart_int = self.rps_velocity_to_internal_velocity(vstart)
@@ -90,15 +150,28 @@ class Tmc5160:
         d1_int = self.rps_acceleration_to_internal_acceleration(d1)
         vstop_int = self.rps_velocity_to_internal_velocity(vstop)
 
+        # Check that all values fit in their registers, the chip would silently drop the upper bits
+        field = self.tmc_ic.FIELD
+        self._check_field_range("VSTART", field.VSTART, vstart_int)
+        self._check_field_range("A1", field.A1, a1_int)
+        self._check_field_range("V1", field.V1_, v1_int)
+        self._check_field_range("AMAX", field.AMAX, amax_int)
+        self._check_field_range("VMAX", field.VMAX, vmax_int)
+        self._check_field_range("DMAX", field.DMAX, dmax_int)
+        self._check_field_range("D1", field.D1, d1_int)
+        self._check_field_range("VSTOP", field.VSTOP, vstop_int)
+
         # Write registers
-        self.tmc_eval.write_register(self.tmc_ic.REG.A1, a1_int)
-        self.tmc_eval.write_register(self.tmc_ic.REG.V1, v1_int)
-        self.tmc_eval.write_register(self.tmc_ic.REG.D1, d1_int)
-        self.tmc_eval.write_register(self.tmc_ic.REG.DMAX, dmax_int)
-        self.tmc_eval.write_register(self.tmc_ic.REG.VSTART, vstart_int)
-        self.tmc_eval.write_register(self.tmc_ic.REG.VSTOP, vstop_int)
-        self.tmc_eval.write_register(self.tmc_ic.REG.AMAX, amax_int)
-        self.tmc_eval.write_register(self.tmc_ic.REG.VMAX, vmax_int)
+        write = self._write_register
+        reg = self.tmc_ic.REG
+        write(reg.A1, a1_int)
+        write(reg.V1, v1_int)
+        write(reg.D1, d1_int)
+        write(reg.DMAX, dmax_int)
+        write(reg.VSTART, vstart_int)
+        write(reg.VSTOP, vstop_int)
+        write(reg.AMAX, amax_int)
+        write(reg.VMAX, vmax_int)
 
         # Pretty print some stuff
         print(f"Written VSTART to {vstart_int} internal units (requested {vstart} rps)")
@@ -115,6 +188,7 @@ class Tmc5160:
         Rotate motor at specified speed in rotations per seconds.
         """
         vmax_int = self.rps_velocity_to_internal_velocity(rps_velocity)
+        self._check_field_range("VMAX", self.tmc_ic.FIELD.VMAX, abs(vmax_int))  # Sign only gives the direction
         self.tmc_motor.rotate(vmax_int)
 
     def rps_velocity_to_internal_velocity(self, rps_velocity):
@@ -122,15 +196,11 @@ class Tmc5160:
         First convert rps to microstep : Vmicro = Vrps / microsteps_per_turn.
         Then convert to internal units for velocity, see datasheet page 81 for calculation.
         """
-        mpt = self.microsteps * self.steps_per_turn  # Microsteps per turn number
-        microstep_velocity = rps_velocity * mpt
-        return int(microstep_velocity / (self.ckl_freq / 2 / (1 << 23)))
+        return int(rps_velocity * self._mpt * self._v_scale)
 
     def rps_acceleration_to_internal_acceleration(self, rps_acceleration):
         """
         First convert rps to microstep : Vmicro = Vrps / microsteps_per_turn.
         Then convert to internal units for acceleration, see datasheet page 81 for calculation.
         """
-        mpt = self.microsteps + self.steps_per_turn  # Microsteps per turn number
-        microstep_acceleration = rps_acceleration * mpt
-        return int((microstep_acceleration * (1 << 24) * 512 * 256) / (self.ckl_freq * self.ckl_freq))
+        return int(rps_acceleration * self._mpt * self._a_scale)
@@ -1,9 +1,6 @@
-import time
-
 import pytrinamic
 from helpers.Tmc5160_helpers import Tmc5160
 from pytrinamic.connections import ConnectionManager
-from pytrinamic.evalboards import TMC5160_eval
 
 pytrinamic.show_info()
 with ConnectionManager().connect() as my_interface: